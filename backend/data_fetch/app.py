@@ -2,55 +2,228 @@
 app.py  ─ Flask + MongoDB backend with:
   • /api/news          → capped text/date/keyword query (≤2 000 docs)
   • /api/vector_search → semantic search via Atlas Vector Search + SBERT
+  • /debug/cache       → hit/miss stats of the in-process query-embedding cache
 
 Environment vars expected:
   MONGO_URI            Atlas cluster URI
   HF_TOKEN             HuggingFace auth (optional but recommended)
   VECTOR_INDEX_NAME    Atlas vector index name   (default: vector_index)
+  QCACHE_INDEX_NAME    Atlas vector index on query_cache.q_emb (default: qcache)
+  EMBEDDING_MODEL      SentenceTransformer id (default: all-mpnet-base-v2)
+  ONNX_MODEL_DIR       int8 ONNX export of the encoder (optional, see below)
+  OMP_NUM_THREADS      encoder threads per process (default: all cores;
+                       gunicorn.conf.py splits the cores across workers)
+
+EMBEDDING_MODEL must match the model process_articles.py used for the stored
+summary_embedding vectors. The static (no-transformer) query encoder
+  EMBEDDING_MODEL=sentence-transformers/static-retrieval-mrl-en-v1
+is ~1 ms per query on CPU but needs the corpus re-embedded with it and the
+Atlas vector index rebuilt at its dimensionality (1024).
+
+Faster CPU encoder (optional) – export + quantize once, then set ONNX_MODEL_DIR:
+  optimum-cli export onnx --model sentence-transformers/all-mpnet-base-v2 \
+      --task feature-extraction --optimize O3 mpnet_onnx/
+  optimum-cli onnxruntime quantize --onnx_model mpnet_onnx/ --avx512_vnni \
+      -o mpnet_onnx/
+
+Indexes (TTL + Atlas vector index for the semantic cache) are created once by
+create_indexes.py, not at app start-up. Query vectors are sent as packed
+float32 BSON vectors (binData subtype 9, Atlas ≥ 6.0.11 / 7.0.2).
+
+Production: gunicorn -c gunicorn.conf.py app:app   (gevent workers)
 """
-import os, json
-from flask import Flask, jsonify, request
+import os, functools, itertools, queue, threading, time
+from concurrent.futures import Future
+import numpy as np
+import torch
+from datetime import datetime, timezone
+import orjson
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from pymongo import MongoClient, errors as pymongo_errors
-from bson import json_util
+from bson import json_util, decode as bson_decode, ObjectId, Decimal128
+from bson.binary import Binary, BinaryVectorDtype
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
 from huggingface_hub import login
+try:
+    import bsonjs                         # python-bsonjs: raw BSON → JSON in C
+except ImportError:
+    bsonjs = None
+try:
+    from gevent import monkey as gevent_monkey, get_hub as gevent_hub
+except ImportError:                       # dev server without gevent
+    gevent_monkey = None
 
 load_dotenv()
 
 # ──────────────── ENV & CONSTANTS ─────────────────────────────────────────────
 MONGO_URI          = os.getenv("MONGO_URI")
 HF_TOKEN           = os.getenv("HF_TOKEN")
+EMBEDDING_MODEL    = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+ONNX_MODEL_DIR     = os.getenv("ONNX_MODEL_DIR")
+ENCODER_THREADS    = int(os.getenv("OMP_NUM_THREADS") or os.cpu_count() or 1)
 VECTOR_INDEX_NAME  = os.getenv("VECTOR_INDEX_NAME", "vector_index")
+QCACHE_INDEX_NAME  = os.getenv("QCACHE_INDEX_NAME", "qcache")
 
 DB_NAME            = "news_database"
 COLLECTION_NAME    = "temp"          # <- adjust if your collection differs
 MAX_RESULTS_LIMIT  = 2_000               # hard cap for /api/news
 VECTOR_LIMIT       = 500                 # default limit for /api/vector_search
-VECTOR_CANDIDATES  = 2_000               # numCandidates should exceed limit
+VECTOR_CANDIDATES  = 2_000               # upper bound on numCandidates
+VECTOR_OVERSAMPLE  = 8                   # numCandidates = limit × this
+VECTOR_MIN_SCORE   = 0.7                 # similarity threshold
+EMBED_CACHE_SIZE   = 4_096               # distinct queries kept by the LRU
+EMBED_MAX_BATCH    = 32                  # queries per shared forward pass
+EMBED_MAX_WAIT     = 0.005               # seconds to wait for batch-mates
+QCACHE_COLLECTION  = "query_cache"       # semantic cache of vector payloads
+QCACHE_MIN_SCORE   = 0.95                # reuse payload above this similarity
+QCACHE_CANDIDATES  = 50
+QUERY_MAX_TIME_MS  = 5_000               # server-side budget per aggregate
+NEWS_STREAM_BATCH  = 200                 # docs per streamed /api/news chunk
 
 # ──────────────── FLASK APP ───────────────────────────────────────────────────
+def _bson_default(o):
+    """orjson fallback keeping extended-JSON shapes (the UI keys on _id.$oid)."""
+    if isinstance(o, ObjectId):
+        return {"$oid": str(o)}
+    if isinstance(o, Decimal128):
+        return {"$numberDecimal": str(o)}
+    raise TypeError(f"Type is not JSON serializable: {type(o).__name__}")
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON layer backed by orjson instead of the stdlib encoder."""
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_bson_default,
+                            option=self._OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
 # ──────────────── EMBEDDING MODEL ─────────────────────────────────────────────
+class _OnnxEncoder:
+    """int8 ONNX Runtime port of the SBERT encoder (mean-pool + L2 norm)."""
+
+    def __init__(self, model_dir: str):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = ENCODER_THREADS
+        opts.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(
+            os.path.join(model_dir, "model_quantized.onnx"), opts,
+            providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts: list[str], batch_size: int = 32, **_):
+        out = []
+        for i in range(0, len(texts), batch_size):
+            tok = self._tokenizer(texts[i:i + batch_size], padding=True,
+                                  truncation=True, max_length=384,
+                                  return_tensors="np")
+            hidden = self._session.run(
+                None, {k: v for k, v in tok.items() if k in self._inputs}
+            )[0]
+            mask = tok["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(1) / np.clip(mask.sum(1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            out.append(pooled / np.clip(norms, 1e-12, None))
+        return np.vstack(out)
+
 embedding_model = None
+torch.set_num_threads(ENCODER_THREADS)        # BLAS threads per forward pass
+torch.set_num_interop_threads(1)              # encode runs one op graph at a time
 try:
-    if HF_TOKEN:
-        login(token=HF_TOKEN)
-    print("Loading SentenceTransformer (all-mpnet-base-v2)…")
-    embedding_model = SentenceTransformer("all-mpnet-base-v2")
-    print("✅  SentenceTransformer ready.")
+    if ONNX_MODEL_DIR:
+        print(f"Loading int8 ONNX encoder from {ONNX_MODEL_DIR}…")
+        embedding_model = _OnnxEncoder(ONNX_MODEL_DIR)
+        print("✅  ONNX encoder ready.")
+    else:
+        if HF_TOKEN:
+            login(token=HF_TOKEN)
+        print(f"Loading SentenceTransformer ({EMBEDDING_MODEL})…")
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        if embedding_model.device.type == "cuda":
+            embedding_model.half()
+        print(f"✅  SentenceTransformer ready on {embedding_model.device}.")
 except Exception as e:
     print("❌  Could not load embedding model:", e)
 
+def _run_blocking(fn, *args, **kwargs):
+    """Run CPU-bound work on a native thread when serving under gevent."""
+    if gevent_monkey is not None and gevent_monkey.is_module_patched("threading"):
+        return gevent_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+class _EmbedBatcher:
+    """Coalesce concurrent queries into one `encode(list)` forward pass."""
+
+    def __init__(self, model):
+        self._model = model
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="embed-batcher",
+                         daemon=True).start()
+
+    def encode(self, text: str):
+        fut = Future()
+        self._queue.put((text, fut))
+        return fut.result()
+
+    def _drain(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + EMBED_MAX_WAIT
+        while len(batch) < EMBED_MAX_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _encode(self, texts: list[str]):
+        with torch.inference_mode():
+            return self._model.encode(texts, batch_size=EMBED_MAX_BATCH,
+                                      convert_to_numpy=True,
+                                      normalize_embeddings=True)
+
+    def _run(self):
+        while True:
+            batch = self._drain()
+            try:
+                vecs = _run_blocking(self._encode, [text for text, _ in batch])
+            except Exception as exc:
+                for _, fut in batch:
+                    fut.set_exception(exc)
+                continue
+            for (_, fut), vec in zip(batch, vecs):
+                fut.set_result(vec)
+
+embed_batcher = _EmbedBatcher(embedding_model) if embedding_model else None
+
+@functools.lru_cache(maxsize=EMBED_CACHE_SIZE)
+def _embed_cached(norm: str) -> Binary:
+    """Encode an already-normalised query; repeats skip the SBERT forward pass."""
+    vec = embed_batcher.encode(norm).astype(np.float32)
+    return Binary.from_vector(vec.tolist(), BinaryVectorDtype.FLOAT32)
+
 def embed(text: str):
-    """Return list[float] or None."""
+    """Return the query as a packed float32 BSON vector, or None."""
     if not embedding_model:
         return None
     try:
-        return embedding_model.encode(text).tolist()
+        return _embed_cached(text.strip().lower())
     except Exception as exc:
         print("Embedding error:", exc)
         return None
@@ -58,10 +231,18 @@ def embed(text: str):
 # ──────────────── MONGODB ─────────────────────────────────────────────────────
 client = None
 collection = None
+query_cache = None
 try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=4_000)
+    client = MongoClient(
+        MONGO_URI,
+        maxPoolSize=200, minPoolSize=20,
+        compressors="zstd,zlib",                # query vectors + summaries
+        serverSelectionTimeoutMS=4_000,
+        retryReads=True
+    )
     client.admin.command("ping")
     collection = client[DB_NAME][COLLECTION_NAME]
+    query_cache = client[DB_NAME][QCACHE_COLLECTION]
     print(f"✅  Mongo connected • DB={DB_NAME} • Col={COLLECTION_NAME}")
 except Exception as e:
     print("❌  Mongo connection failed:", e)
@@ -71,9 +252,78 @@ PROJECTION = {
     "_id": 1, "title": 1, "summary": 1, "url": 1,
     "latitude": 1, "longitude": 1, "SQLDATE": 1, "SOURCEURL": 1
 }
+# same predicate as the partial index in create_indexes.py ($ne: null can't be
+# used in a partialFilterExpression, and the planner needs an exact match)
+GEO_MATCH = {"latitude": {"$type": "number"}, "longitude": {"$type": "number"}}
+# hinted on the no-?q path: without a SQLDATE predicate the planner would not
+# pick it and falls back to a COLLSCAN; every entry already satisfies GEO_MATCH,
+# so $limit stops after `limit` index keys (keep in sync with create_indexes.py)
+GEO_INDEX = "SQLDATE_1__id_1_geo"
+
+def _is_bad_hint(e):
+    """True for the BadValue a hint naming a non-existent index raises."""
+    return e.code == 2 and "hint" in str(e.details.get("errmsg", e))
+# static pipeline stages, built once (pymongo never mutates a pipeline)
+_PROJECT_STAGE        = {"$project": PROJECTION}
+_VECTOR_PROJECT_STAGE = {"$project": {**PROJECTION,
+                                      "score": {"$meta": "vectorSearchScore"}}}
+_QCACHE_PROJECT_STAGE = {"$project": {"payload": 1,
+                                      "score": {"$meta": "vectorSearchScore"}}}
 def _j(d):
-    """BSON-safe JSON response."""
-    return json.loads(json_util.dumps(d))
+    """BSON-safe JSON response (orjson via ORJSONProvider)."""
+    return jsonify(d)
+
+def _raw_docs(batch: bytes):
+    """Split a raw BSON batch into per-document slices (int32 length prefix)."""
+    view, pos = memoryview(batch), 0
+    while pos < len(view):
+        size = int.from_bytes(view[pos:pos + 4], "little")
+        yield view[pos:pos + size]
+        pos += size
+
+def _raw_json(doc) -> str:
+    """Relaxed extended JSON for one raw BSON document, no dict in between."""
+    doc = bytes(doc)
+    if bsonjs is not None:
+        return bsonjs.dumps(doc, mode=bsonjs.RELAXED)
+    return json_util.dumps(bson_decode(doc),
+                           json_options=json_util.RELAXED_JSON_OPTIONS)
+
+def _qcache_get(vec, limit: int):
+    """Return the cached payload of a near-identical earlier query, or None."""
+    if query_cache is None:
+        return None
+    pipe = [
+        {"$vectorSearch": {
+            "index": QCACHE_INDEX_NAME,
+            "path": "q_emb",
+            "queryVector": vec,
+            "numCandidates": QCACHE_CANDIDATES,
+            "limit": 1,
+            "filter": {"limit": limit}      # payload size depends on ?limit
+        }},
+        _QCACHE_PROJECT_STAGE
+    ]
+    try:
+        hit = next(query_cache.aggregate(pipe), None)
+    except pymongo_errors.PyMongoError as e:
+        print("Query-cache lookup failed:", e)
+        return None
+    if hit and hit["score"] > QCACHE_MIN_SCORE:
+        return hit["payload"]
+    return None
+
+def _qcache_put(vec, limit: int, payload):
+    """Store a vector-search payload; the TTL index on `ts` evicts it."""
+    if query_cache is None:
+        return
+    try:
+        query_cache.insert_one({
+            "q_emb": vec, "limit": limit, "payload": payload,
+            "ts": datetime.now(timezone.utc)
+        })
+    except pymongo_errors.PyMongoError as e:
+        print("Query-cache store failed:", e)
 
 # ──────────────── ROUTES ──────────────────────────────────────────────────────
 @app.route("/api/news")
@@ -90,38 +340,91 @@ def api_news():
 
     # ---------- aggregation pipeline ----------
     pipe = []
+    options = {}
 
     if q:
-        pipe += [
-            {"$search": {
-                "index": "default",
-                "text": {"path": {"wildcard": "*"}, "query": q}
-            }},
-            {"$addFields": {"score": {"$meta": "searchScore"}}},
-            {"$sort": {"score": -1}}
-        ]
-
-    match = {"latitude": {"$ne": None}, "longitude": {"$ne": None}}
-    if frm or to:
-        date_range = {}
-        if frm: date_range["$gte"] = frm
-        if to:  date_range["$lte"] = to
-        match["SQLDATE"] = date_range
-    pipe.append({"$match": match})
-
-    pipe.append({"$project": PROJECTION})
+        # geo/date guards run inside Lucene; $search already yields
+        # documents in descending searchScore order, so no $sort stage.
+        filters = [{"exists": {"path": "latitude"}},
+                   {"exists": {"path": "longitude"}}]
+        if frm or to:
+            date_range = {"path": "SQLDATE"}
+            if frm: date_range["gte"] = frm
+            if to:  date_range["lte"] = to
+            filters.append({"range": date_range})
+        pipe.append({"$search": {
+            "index": "default",
+            "compound": {
+                "must": [{"text": {"path": {"wildcard": "*"}, "query": q}}],
+                "filter": filters
+            }
+        }})
+    else:
+        match = dict(GEO_MATCH)
+        if frm or to:
+            date_range = {}
+            if frm: date_range["$gte"] = frm
+            if to:  date_range["$lte"] = to
+            match["SQLDATE"] = date_range
+        pipe.append({"$match": match})
+        options["hint"] = GEO_INDEX
+
+    pipe.append(_PROJECT_STAGE)
     pipe.append({"$limit": limit})
 
     # ---------- run ----------
+    def open_cursor(**opts):
+        # aggregate_raw_batches sends the aggregate with batchSize 0, so
+        # pull the first batch here too: a failure before any docs arrive
+        # (plan error, maxTimeMS hit early) is still a JSON 500
+        cursor = collection.aggregate_raw_batches(
+            pipe, batchSize=NEWS_STREAM_BATCH, allowDiskUse=False,
+            maxTimeMS=QUERY_MAX_TIME_MS, **opts
+        )
+        try:
+            return cursor, next(cursor, None)
+        except BaseException:
+            cursor.close()
+            raise
+
     try:
-        docs = list(collection.aggregate(pipe))
-        return _j({
-            "results": docs,
-            "count": len(docs),
-            "limit_applied": len(docs) >= limit
-        })
+        try:
+            cursor, first = open_cursor(**options)
+        except pymongo_errors.OperationFailure as e:
+            if "hint" not in options or not _is_bad_hint(e):
+                raise
+            # GEO_INDEX not built yet (create_indexes.py not run, or
+            # populate_db.py just dropped the collection): slower, not a 500
+            print(f"{GEO_INDEX} missing; /api/news running unhinted")
+            cursor, first = open_cursor()
     except pymongo_errors.OperationFailure as e:
         return jsonify({"error": e.details.get("errmsg", str(e))}), 500
+    except pymongo_errors.PyMongoError as e:
+        return jsonify({"error": str(e)}), 500
+
+    def stream():
+        count = 0
+        error = None
+        batches = itertools.chain(() if first is None else (first,), cursor)
+        yield '{"results":['
+        with cursor:                          # killCursors if the client drops
+            try:
+                for batch in batches:
+                    docs = [_raw_json(doc) for doc in _raw_docs(batch)]
+                    if docs:
+                        yield ("," if count else "") + ",".join(docs)
+                        count += len(docs)
+            except pymongo_errors.PyMongoError as e:
+                # status 200 is already sent: keep the body valid JSON and
+                # report the truncation in the envelope instead
+                print("/api/news stream failed:", e)
+                error = str(e)
+        yield '],"count":%d,"limit_applied":%s%s}' % (
+            count, "true" if count >= limit else "false",
+            "" if error is None else ',"error":' + orjson.dumps(error).decode()
+        )
+
+    return Response(stream_with_context(stream()), mimetype="application/json")
 
 @app.route("/api/vector_search")
 def api_vector():
@@ -139,27 +442,42 @@ def api_vector():
     if vec is None:
         return jsonify({"error": "Embedding failed"}), 500
 
+    cached = _qcache_get(vec, limit)
+    if cached is not None:
+        return _j(cached)
+
     pipe = [
         {"$vectorSearch": {
             "index": VECTOR_INDEX_NAME,
             "path": "summary_embedding",        # field holding your vectors
             "queryVector": vec,
-            "numCandidates": max(VECTOR_CANDIDATES, limit * 4),
+            "numCandidates": min(limit * VECTOR_OVERSAMPLE, VECTOR_CANDIDATES),
             "limit": limit
         }},
-        {"$project": {**PROJECTION, "score": {"$meta": "vectorSearchScore"}}},
-        {"$match": {"score": {"$gt": 0.7}}}      # similarity threshold
+        _VECTOR_PROJECT_STAGE
     ]
 
     try:
-        docs = list(collection.aggregate(pipe))
-        return _j({"results": docs, "count": len(docs), "limit_applied": None})
+        # hits arrive best-first, so the threshold is a cut, not a filter
+        docs = list(itertools.takewhile(
+            lambda d: d["score"] > VECTOR_MIN_SCORE,
+            collection.aggregate(pipe, batchSize=limit, allowDiskUse=False,
+                                 maxTimeMS=QUERY_MAX_TIME_MS)
+        ))
+        payload = {"results": docs, "count": len(docs), "limit_applied": None}
+        _qcache_put(vec, limit, payload)
+        return _j(payload)
     except pymongo_errors.OperationFailure as e:
         msg = e.details.get("errmsg", str(e))
         if "index not found" in msg.lower():
             msg += f" — check VECTOR_INDEX_NAME='{VECTOR_INDEX_NAME}' in Atlas."
         return jsonify({"error": msg}), 500
 
+@app.route("/debug/cache")
+def debug_cache():
+    """Expose LRU stats so EMBED_CACHE_SIZE can be tuned."""
+    return jsonify(_embed_cached.cache_info()._asdict())
+
 # ──────────────── MAIN ────────────────────────────────────────────────────────
 if __name__ == "__main__":
     ready = client is not None and embedding_model is not None
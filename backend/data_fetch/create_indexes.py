@@ -0,0 +1,88 @@
+"""
+create_indexes.py  ─ one-shot index migration for the Flask backend.
+
+Run once per cluster (re-running is harmless):
+  python create_indexes.py
+
+MongoDB indexes created here:
+  query_cache.ts       TTL index, evicts semantic-cache entries after 1 h
+  <articles>.SQLDATE_1__id_1_geo
+                       partial index over geo-located docs only; serves the
+                       date/geo $match + $limit of /api/news without ?q.
+                       app.py hints it (GEO_INDEX), so the default no-date
+                       call is an index scan that stops after `limit` keys
+                       rather than a COLLSCAN; with a date range it is a
+                       bounded SQLDATE range scan
+                       (replaces the earlier SQLDATE_1_latitude_1_longitude_1)
+
+Atlas Search / Vector Search indexes must be defined in the Atlas UI or API:
+  <articles>   → search index "default" (dynamic) with explicit mappings so
+                 the compound.filter clauses of /api/news can run in Lucene:
+      {"mappings": {"dynamic": true, "fields": {
+          "latitude":  {"type": "number"},
+          "longitude": {"type": "number"},
+          "SQLDATE":   {"type": "token"}
+      }}}
+  <articles>   → vector index "vector_index" (VECTOR_INDEX_NAME)
+      {"fields": [
+          {"type": "vector", "path": "summary_embedding",
+           "numDimensions": 768, "similarity": "dotProduct"}  # EMBEDDING_MODEL dim
+      ]}
+  query_cache  → vector index "qcache" (QCACHE_INDEX_NAME)
+      {"fields": [
+          {"type": "vector", "path": "q_emb",
+           "numDimensions": 768, "similarity": "dotProduct"}, # EMBEDDING_MODEL dim
+          {"type": "filter", "path": "limit"}
+      ]}
+
+summary_embedding and q_emb are stored as packed float32 vectors (binData
+subtype 9, pymongo ≥ 4.10); decode one with
+np.frombuffer(vec, dtype="<f4", offset=2) or vec.as_vector().
+
+dotProduct is only valid because every stored and query vector is L2-normalised
+(app.py, process_articles.py, populate_db.py); it then ranks and scores exactly
+like cosine without the per-candidate norm, so the 0.7 / 0.95 thresholds hold.
+
+Environment vars expected:
+  MONGO_URI            Atlas cluster URI
+"""
+import os
+from pymongo import MongoClient, ASCENDING
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ──────────────── ENV & CONSTANTS ─────────────────────────────────────────────
+MONGO_URI          = os.getenv("MONGO_URI")
+
+DB_NAME            = "news_database"
+COLLECTION_NAME    = "temp"              # keep in sync with app.py
+QCACHE_COLLECTION  = "query_cache"
+QCACHE_TTL_SECONDS = 3_600
+GEO_PARTIAL_FILTER = {"latitude":  {"$type": "number"},   # keep in sync with
+                      "longitude": {"$type": "number"}}   # app.GEO_MATCH
+
+# ──────────────── MAIN ────────────────────────────────────────────────────────
+def main():
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=4_000)
+    db = client[DB_NAME]
+
+    articles = db[COLLECTION_NAME]
+    if "SQLDATE_1_latitude_1_longitude_1" in articles.index_information():
+        articles.drop_index("SQLDATE_1_latitude_1_longitude_1")
+    name = articles.create_index(
+        [("SQLDATE", ASCENDING), ("_id", ASCENDING)],
+        name="SQLDATE_1__id_1_geo",                # app.GEO_INDEX hints this name
+        partialFilterExpression=GEO_PARTIAL_FILTER
+    )
+    print(f"✅  {COLLECTION_NAME}.{name}")
+
+    name = db[QCACHE_COLLECTION].create_index(
+        [("ts", ASCENDING)], expireAfterSeconds=QCACHE_TTL_SECONDS
+    )
+    print(f"✅  {QCACHE_COLLECTION}.{name} (TTL {QCACHE_TTL_SECONDS}s)")
+
+    client.close()
+
+if __name__ == "__main__":
+    main()
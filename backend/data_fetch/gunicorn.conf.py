@@ -0,0 +1,23 @@
+"""
+gunicorn.conf.py  ─ production server settings for app.py
+
+  gunicorn -c gunicorn.conf.py app:app
+
+gevent workers multiplex many in-flight requests per process, so a request
+waiting on Atlas yields instead of pinning a worker thread. SBERT encoding is
+pushed onto gevent's native threadpool inside app.py (see _run_blocking).
+Each worker loads its own copy of the embedding model (~420 MB) and gets an
+equal share of the cores for its BLAS/OpenMP threads.
+"""
+import os
+
+bind               = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+workers            = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class       = "gevent"
+worker_connections = 500
+timeout            = 60
+
+# Read by torch/MKL/ONNX Runtime at import time in each worker.
+_threads = str(max(1, (os.cpu_count() or 1) // workers))
+os.environ.setdefault("OMP_NUM_THREADS", _threads)
+os.environ.setdefault("MKL_NUM_THREADS", _threads)
@@ -1,25 +1,35 @@
-import asyncio, aiohttp, pandas as pd, os, json
+import asyncio, aiohttp, pandas as pd, os
+import orjson
+import re
+import threading
+import hashlib
+import codecs
+import math
+from collections import Counter, OrderedDict, deque
 from newspaper import Article
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from tqdm.asyncio import tqdm
 import nltk
 from google.cloud import storage
 from dotenv import load_dotenv
-import datetime
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import BulkWriteError, ConnectionFailure
+from pymongo.write_concern import WriteConcern
+from bson.binary import Binary, BinaryVectorDtype
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from huggingface_hub import login
 from urllib.parse import quote
-from google.cloud import storage
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError: # Ships with requests (a newspaper3k dependency); undeclared non-UTF-8 pages then keep U+FFFD
+    detect_charset = None
 
 # Load environment variables from .env file for local testing
 load_dotenv()
 
 # --- NLTK Data Handling Configuration for Local Testing ---
+nltk_data_path = os.path.join(os.path.expanduser("~"), "nltk_data")
 try:
-    nltk_data_path = os.path.join(os.path.expanduser("~"), "nltk_data")
     if not os.path.exists(os.path.join(nltk_data_path, 'tokenizers/punkt')):
         print("NLTK 'punkt' not found locally. Attempting download to user's home 'nltk_data' folder...")
         os.makedirs(nltk_data_path, exist_ok=True)
@@ -32,13 +42,47 @@ except Exception as e:
 # --- Global Configurations ---
 CONN = 10
 PROC = os.cpu_count() or 4
-TIMEOUT = aiohttp.ClientTimeout(total=20)
+DNS_CACHE_TTL = 600 # seconds; GDELT batches hit the same news hosts over and over
+LIMIT_PER_HOST = 4 # keep-alive connections per site, and politeness toward any one publisher
+BATCHES_IN_FLIGHT = 2 # CSV batches pipelined at once (one fetching while another embeds/inserts)
+FETCH_TIMEOUT = 20 # seconds for one page once it has a connection
+# `total` also counts waiting for a pooled connection: if all CONN fetches of a
+# batch (each batch has its own connector) target one outlet, the last waits
+# behind the others LIMIT_PER_HOST at a time. sock_connect (not connect, which
+# includes that wait) caps the TCP/TLS setup.
+TIMEOUT = aiohttp.ClientTimeout(
+    total=FETCH_TIMEOUT * math.ceil(CONN / LIMIT_PER_HOST),
+    sock_connect=5, sock_read=FETCH_TIMEOUT
+)
+INSERT_BATCH_SIZE = 128 # Records per insert_many shard handed to a writer thread
+MONGO_WRITERS = 16 # Concurrent insert_many calls; the client pool is sized at twice this
+ENCODE_CHUNK_SIZE = INSERT_BATCH_SIZE * MONGO_WRITERS # Records per encode; its shards fill every writer
+CSV_COLUMNS = ['SQLDATE', 'NumMentions', 'SOURCEURL', 'latitude', 'longitude'] # Cleaned-CSV fields kept per article
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2") # must match the API's query encoder
+EMBEDDING_INT8 = os.getenv("EMBEDDING_INT8") == "1" # CPU only: int8 dynamic quantization (opt-in, not bit-compatible)
+EMBED_BATCH_SIZE = 128 # Sentences per forward pass
+EMBEDDING_CACHE_SIZE = 50_000 # In-process summary embeddings kept (~3 KB each)
+EMBEDDING_CACHE_COLLECTION = "embedding_cache" # Cross-run summary embedding cache {_id: hash, v: vector}
+CLEANED_CSV_RE = re.compile(r'^\d{14}_cleaned\.csv$') # YYYYMMDDHHMMSS_cleaned.csv
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.75 Safari/537.36"}
 
 _sentence_transformer_model = None # For SentenceTransformer model
+_sentence_transformer_precision = None # 'fp32' | 'fp16' | 'int8' once loaded
+_sentence_transformer_load_failed = False # Don't retry a failed load for every row
+_sentence_transformer_lock = threading.Lock() # Pipelined batches may ask for the model concurrently
+_embedding_cache = OrderedDict() # summary_hash -> packed vector, LRU; only touched by the embedder thread
 
 
 # ---------- Helper functions for Article Extraction (Stage 2 Logic) ---------- #
+def _init_parse_worker():
+    """ProcessPoolExecutor initializer: warms newspaper3k/NLTK once per worker instead of on the first parse."""
+    try:
+        if nltk_data_path not in nltk.data.path:
+            nltk.data.path.append(nltk_data_path)
+        nltk.data.load('tokenizers/punkt/english.pickle') # cached by nltk; reused by Article.nlp()
+    except Exception as e:
+        print(f"Warning: parse worker could not preload NLTK punkt: {e}")
+
 def parse_article(html: str, url: str):
     """Parses HTML content using newspaper3k and returns extracted article details."""
     try:
@@ -59,128 +103,243 @@ def parse_article(html: str, url: str):
             "keywords": None, "error": f"parse_error: {type(e).__name__}: {e}"
         }
 
-async def fetch_html(session: aiohttp.ClientSession, url: str) -> tuple[str, str]:
-    """Return (url, html) or (url, None) on error, with robust encoding."""
+async def fetch_html(session: aiohttp.ClientSession, url: str, stats: Counter) -> tuple[str, str]:
+    """Return (url, html) or (url, None) on error. Outcomes are tallied in `stats` rather than printed per URL."""
     try:
-        async with session.get(url, timeout=TIMEOUT, headers=HEADERS) as r:
+        async with session.get(url) as r: # timeout and headers are set on the session
             r.raise_for_status()
             content_type_header = r.headers.get("Content-Type", "").lower()
-            
+            if "text/html" not in content_type_header and "text/plain" not in content_type_header:
+                stats["non_text"] += 1
+                return url, None
+
             charset = None
             if 'charset=' in content_type_header:
-                charset = content_type_header.split('charset=')[-1].split(';')[0].strip()
-                
+                charset = content_type_header.split('charset=')[-1].split(';')[0].strip().strip('"\'')
+                try:
+                    codecs.lookup(charset)
+                except LookupError:
+                    stats["unknown_charset"] += 1
+                    charset = None
+
             raw_bytes = await r.read()
 
-            decoded_text = None
-            if charset:
-                try:
-                    decoded_text = raw_bytes.decode(charset)
-                except (UnicodeDecodeError, LookupError):
-                    print(f"Warning: Failed to decode {url} with declared charset '{charset}'. Trying fallbacks.")
+            # One decode that never raises; mis-decoded bytes become U+FFFD
+            decoded_text = raw_bytes.decode(charset or 'utf-8', errors='replace')
+            if charset is None and '\ufffd' in decoded_text and detect_charset is not None:
+                # Undeclared and not UTF-8: only now pay for detection
+                best = detect_charset(raw_bytes).best()
+                if best is not None:
+                    decoded_text = str(best)
+                    stats["detected_charset"] += 1
+                else:
+                    stats["replaced_chars"] += 1
+            elif '\ufffd' in decoded_text:
+                stats["replaced_chars"] += 1
+            stats["ok"] += 1
+            return url, decoded_text
 
-            if decoded_text is None: # If no charset or decoding failed, try common fallbacks
-                try:
-                    decoded_text = raw_bytes.decode('utf-8', errors='strict')
-                except UnicodeDecodeError:
-                    try:
-                        decoded_text = raw_bytes.decode('latin-1')
-                        print(f"Decoded {url} with latin-1 due to UTF-8 error.")
-                    except UnicodeDecodeError:
-                        print(f"Critical decode failure for {url}. Giving up.")
-                        return url, None
-            
-            if decoded_text and ("text/html" in content_type_header or "text/plain" in content_type_header):
-                return url, decoded_text
-            else:
-                print(f"Skipping non-text content for {url}: {content_type_header}")
-                return url, None
-                
     except Exception as e:
-        print(f"Failed to fetch {url}: {type(e).__name__}: {e}")
+        stats[f"fetch_error:{type(e).__name__}"] += 1
         return url, None
 
-async def producer(urls, queue: asyncio.Queue):
-    """Fetch pages concurrently and push html into a queue for parsing."""
-    sem = asyncio.Semaphore(CONN)
-    async with aiohttp.ClientSession() as sess:
-        async def bounded_fetch(u):
-            async with sem:
-                return await fetch_html(sess, u)
-
-        for coro in tqdm(asyncio.as_completed(map(bounded_fetch, urls)),
-                         total=len(urls), desc="Downloading"):
-            url, html = await coro
-            await queue.put((url, html))
-    for _ in range(PROC):
-        await queue.put((None, None))
-
-async def consumer(queue: asyncio.Queue, out_path: str):
-    """Pop (url, html), run newspaper3k in a separate process, append to disk."""
+def failed_result(error: str):
+    """Article record for a URL that could not be downloaded or parsed."""
+    return {"title": None, "text": None, "summary": None,
+            "keywords": None, "error": error}
+
+async def main_async_pipeline(urls, pool):
+    """Fetches and parses every URL: each task downloads under a CONN gate, then parses under a PROC gate.
+
+    Returns {url: article}. `pool` is the caller's parse ProcessPoolExecutor, shared across batches.
+    """
     loop = asyncio.get_running_loop()
-    with ProcessPoolExecutor(max_workers=PROC) as pool:
-        while True:
-            url, html = await queue.get()
-            if url is None:
-                break
+    sem_fetch = asyncio.Semaphore(CONN)
+    sem_parse = asyncio.Semaphore(PROC)
+    articles = {} # Only touched between awaits, so no lock is needed
+    fetch_stats = Counter()
+
+    connector = aiohttp.TCPConnector(limit=CONN * 2, limit_per_host=LIMIT_PER_HOST,
+                                     ttl_dns_cache=DNS_CACHE_TTL, use_dns_cache=True,
+                                     keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=TIMEOUT, headers=HEADERS) as sess:
+        async def handle(u):
+            async with sem_fetch:
+                url, html = await fetch_html(sess, u, fetch_stats)
 
             if html is None:
-                result = {"title": None, "text": None, "summary": None,
-                          "keywords": None, "error": "download_failed"}
+                result = failed_result("download_failed")
             else:
-                try:
-                    result = await loop.run_in_executor(pool, parse_article, html, url)
-                except Exception as e:
-                    result = {"title": None, "text": None, "summary": None,
-                              "keywords": None, "error": f"parse_error: {e}"}
-
-            with open(out_path, "a", encoding="utf8") as f:
-                f.write(json.dumps({"url": url, **result}, ensure_ascii=False) + "\n")
-            queue.task_done()
-
-async def main_async_pipeline(urls, output_ndjson_path):
-    """Main asynchronous orchestrator for fetching and parsing."""
-    # NDJSON_OUT is no longer a global but passed as an argument.
-    # The original GLOBAL_NDJSON_OUT_PATH was for Cloud Function version, can be removed if not needed.
-    # For this local script, NDJSON_OUT is just a variable within this function's scope.
-    
-    queue = asyncio.Queue(maxsize=CONN * 2)
-    consumers = [asyncio.create_task(consumer(queue, output_ndjson_path))
-                 for _ in range(PROC)]
-    await producer(urls, queue)
-    await asyncio.gather(*consumers)
+                async with sem_parse:
+                    try:
+                        result = await loop.run_in_executor(pool, parse_article, html, url)
+                    except Exception as e:
+                        result = failed_result(f"parse_error: {e}")
+
+            articles[url] = {"url": url, **result}
+
+        await tqdm.gather(*(handle(u) for u in urls), desc="Downloading & parsing")
+    print(f"Fetch outcomes: {dict(fetch_stats.most_common())}")
+    return articles
+
+def write_ndjson_backup(path, articles):
+    """Writes a batch's parsed articles to `path` as NDJSON (audit/restart copy; nothing reads it back)."""
+    with open(path, "wb", buffering=1 << 20) as out:
+        for article in articles.values():
+            out.write(orjson.dumps(article) + b"\n") # UTF-8 bytes, no encode step
 
 
 # ---------- Helper functions for Embedding Generation & MongoDB (Stage 3 Logic) ---------- #
-def get_embeddings(text: str, embedding_type: str = "sentencetransformer", dimensionality: int = 768):
-    """Generates embeddings for the given text using SentenceTransformer."""
-    global _sentence_transformer_model
+def load_sentence_transformer():
+    """Loads the SentenceTransformer model once per process; returns None if it cannot be loaded."""
+    global _sentence_transformer_model, _sentence_transformer_load_failed, _sentence_transformer_precision
 
-    if embedding_type == "sentencetransformer":
-        if _sentence_transformer_model is None:
-            print("Initializing SentenceTransformer model (all-mpnet-base-v2)... This may take a moment on first run.")
+    with _sentence_transformer_lock:
+        if _sentence_transformer_model is None and not _sentence_transformer_load_failed:
+            print(f"Initializing SentenceTransformer model ({EMBEDDING_MODEL})... This may take a moment on first run.")
             try:
+                # Imported here so parse workers (re-importing this module under spawn) skip torch
+                from sentence_transformers import SentenceTransformer
+                from huggingface_hub import login
                 hf_token = os.getenv('HF_TOKEN')
                 if hf_token:
                     login(token=hf_token, add_to_git_credential=False)
-                _sentence_transformer_model = SentenceTransformer('all-mpnet-base-v2')
-                print("SentenceTransformer model loaded.")
+                import torch
+                device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                model = SentenceTransformer(EMBEDDING_MODEL, device=device)
+                precision = 'fp32'
+                if device == 'cuda':
+                    model = model.half() # FP16: half the bytes, tensor-core matmuls
+                    precision = 'fp16'
+                elif EMBEDDING_INT8:
+                    # Dynamic int8 Linear layers; vectors drift slightly from the API's FP32 query encoder
+                    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                    precision = 'int8'
+                _sentence_transformer_model = model
+                _sentence_transformer_precision = precision
+                print(f"SentenceTransformer model loaded ({device}, {precision}).")
             except Exception as e:
                 print(f"Error loading SentenceTransformer model: {e}")
-                return None
-        
+                _sentence_transformer_load_failed = True
+    return _sentence_transformer_model
+
+def has_summary(text) -> bool:
+    """True when a parsed summary is worth embedding."""
+    return bool(text) and isinstance(text, str) and bool(text.strip()) and text != 'null'
+
+def get_embeddings(texts: list[str], embedding_type: str = "sentencetransformer", batch_size: int = EMBED_BATCH_SIZE):
+    """Generates embeddings for a list of texts in one batched SentenceTransformer call; returns an (n, dim) array or None."""
+    if embedding_type == "sentencetransformer":
+        model = load_sentence_transformer()
+        if model is None:
+            return None
+
         try:
-            if pd.isna(text) or text is None:
-                return None
-            embedding = _sentence_transformer_model.encode(text)
-            return embedding.tolist()
+            import torch
+            with torch.inference_mode():
+                return model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                    show_progress_bar=False,
+                                    normalize_embeddings=True) # unit length for the dotProduct index
         except Exception as e:
-            print(f"Error generating embedding for text: '{str(text)[:50]}...': {e}")
+            print(f"Error generating embeddings for {len(texts)} summaries: {e}")
             return None
     else:
         print(f"Unsupported embedding type: {embedding_type}")
         return None
 
+def summary_hash(text: str) -> str:
+    """Cache key for a summary: whitespace-normalised text, salted with the model so a model swap can't hit stale vectors."""
+    normalized = " ".join(text.split())
+    return hashlib.blake2b(f"{EMBEDDING_MODEL}\0{normalized}".encode("utf8"), digest_size=16).hexdigest()
+
+def _remember_embedding(key, vector):
+    _embedding_cache[key] = vector
+    _embedding_cache.move_to_end(key)
+    if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+        _embedding_cache.popitem(last=False)
+
+def embed_summaries(records, cache_collection=None):
+    """Batch-encodes the summaries of `records` in place, setting summary_embedding or embedding_error.
+
+    Repeated summaries (wire-service ledes, newsletter boilerplate) are served from the
+    in-process LRU, then from `cache_collection` in one $in lookup; only misses are encoded.
+    """
+    to_embed = [rec for rec in records if has_summary(rec.get('summary'))]
+    if not to_embed:
+        return
+
+    keys = [summary_hash(rec['summary']) for rec in to_embed]
+    vectors = {k: _embedding_cache[k] for k in set(keys) if k in _embedding_cache}
+    for k in vectors:
+        _embedding_cache.move_to_end(k)
+
+    if cache_collection is not None:
+        wanted = [k for k in set(keys) if k not in vectors]
+        if wanted:
+            try:
+                for doc in cache_collection.find({'_id': {'$in': wanted}}):
+                    vectors[doc['_id']] = doc['v']
+                    _remember_embedding(doc['_id'], doc['v'])
+            except Exception as e:
+                print(f"Warning: embedding cache lookup failed, encoding everything: {e}")
+
+    # One encode call over the distinct misses
+    misses = {}
+    for rec, k in zip(to_embed, keys):
+        if k not in vectors and k not in misses:
+            misses[k] = rec['summary']
+    if misses:
+        embeddings = get_embeddings(list(misses.values()), embedding_type="sentencetransformer")
+        if embeddings is None:
+            print(f"Warning: Failed to generate embeddings for {len(misses)} summaries in this chunk.")
+        else:
+            new_entries = []
+            for k, embedding in zip(misses, embeddings):
+                # Packed float32 vector (binData subtype 9): ~3 KB instead of ~10 KB of BSON doubles
+                vector = Binary.from_vector(embedding.astype(np.float32).tolist(), BinaryVectorDtype.FLOAT32)
+                vectors[k] = vector
+                _remember_embedding(k, vector)
+                new_entries.append({'_id': k, 'v': vector})
+            # int8 vectors drift from FP32/FP16 ones under the same key: keep them
+            # in this process only so they never leak into later runs
+            if cache_collection is not None and _sentence_transformer_precision != 'int8':
+                try:
+                    # w=0 collection: no ack round-trip; a concurrent duplicate _id is simply dropped
+                    cache_collection.insert_many(new_entries, ordered=False) # bypass_document_validation is rejected with w=0
+                except Exception as e:
+                    print(f"Warning: could not store {len(new_entries)} embeddings in the cache: {e}")
+
+    for rec, k in zip(to_embed, keys):
+        if k in vectors:
+            rec['summary_embedding'] = vectors[k]
+        else:
+            rec['embedding_error'] = 'embedding_generation_failed'
+
+def insert_records(collection, records):
+    """Inserts one chunk of records (runs on a writer thread) and returns how many landed.
+
+    Unordered, so the server attempts every document. Duplicate-key errors (11000)
+    are tolerated and reported. No unique index on `articles` exists today, so in
+    practice this is only error reporting. Any other write error is re-raised so the
+    batch fails and its CSV stays in GCS for a retry.
+
+    Never create indexes from here. `articles` has none beyond _id today; any
+    future one belongs in a one-shot migration (as backend/data_fetch/create_indexes.py
+    does for the API's collections), not in every ingest batch.
+    """
+    try:
+        collection.insert_many(records, ordered=False, bypass_document_validation=True)
+        return len(records)
+    except BulkWriteError as bwe:
+        write_errors = bwe.details.get('writeErrors', [])
+        n_dup = sum(1 for e in write_errors if e.get('code') == 11000)
+        if len(write_errors) > n_dup:
+            first = next(e for e in write_errors if e.get('code') != 11000)
+            print(f"ERROR: {len(write_errors) - n_dup} articles failed to insert: {first.get('errmsg')}")
+            raise
+        print(f"Skipped {n_dup} duplicate articles.")
+        return bwe.details.get('nInserted', 0)
+
 def connect_to_mongodb():
     username = os.getenv("MONGODB_USERNAME")
     password = os.getenv("MONGODB_PASSWORD")
@@ -195,7 +354,8 @@ def connect_to_mongodb():
     mongo_uri = f"mongodb+srv://{username_encoded}:{password_encoded}@{host}/?retryWrites=true&w=majority&appName=Cluster0"
     
     try:
-        client = MongoClient(mongo_uri)
+        client = MongoClient(mongo_uri, compressors="zstd,zlib", # embeddings dominate the wire bytes
+                             maxPoolSize=2 * MONGO_WRITERS)
         client.admin.command('ping') 
         print("Successfully connected to MongoDB!")
         return client
@@ -204,6 +364,25 @@ def connect_to_mongodb():
         return None
 
 
+def list_cleaned_blobs(storage_client, bucket_name, prefix, skip_names):
+    """Lists the cleaned CSVs under prefix in one paged scan, oldest first.
+
+    YYYYMMDDHHMMSS_cleaned.csv names sort chronologically, so name order is age order.
+    """
+    pending = []
+    for blob in storage_client.list_blobs(bucket_name, prefix=prefix, fields='items(name),nextPageToken'):
+        if blob.name in skip_names:
+            continue
+        filename = blob.name[len(prefix):]
+        if not CLEANED_CSV_RE.match(filename):
+            if filename.endswith("_cleaned.csv"):
+                print(f"Warning: Could not parse timestamp from filename: {blob.name}. Skipping this file.")
+            continue
+        pending.append(blob)
+    pending.sort(key=lambda b: b.name)
+    return deque(pending)
+
+
 # ------------------------------ Main Local Batch Processor Loop ------------------------------- #
 if __name__ == "__main__":
     print("Starting GDELT Batch Processor: Pulling, Extracting, Embedding, and Uploading to MongoDB...")
@@ -229,110 +408,73 @@ if __name__ == "__main__":
 
     db = mongo_client['news_database']
     collection = db['articles']
+    embedding_cache = db[EMBEDDING_CACHE_COLLECTION].with_options(write_concern=WriteConcern(w=0))
+    # Writer threads: each INSERT_BATCH_SIZE shard is its own concurrent insert_many
+    # (with its own BulkWriteError handling), overlapping with embedding the next chunk
+    mongo_writer = ThreadPoolExecutor(max_workers=MONGO_WRITERS)
 
     # --- Define Local Temporary Directories ---
     local_temp_dir = "/tmp" # For downloaded CSVs
-    local_extracted_articles_output_dir = "extracted_articles_local" # For NDJSON output from article extraction
+    local_extracted_articles_output_dir = "extracted_articles_local" # Per-batch NDJSON backups of extracted articles (kept)
 
     os.makedirs(local_extracted_articles_output_dir, exist_ok=True)
 
 
     # --- Main Processing Loop ---
+    # Blocking GCS / pandas / encode calls run on worker threads so up to
+    # BATCHES_IN_FLIGHT CSVs overlap: one fetching articles while another embeds and inserts.
+    io_executor = ThreadPoolExecutor(max_workers=2 * BATCHES_IN_FLIGHT) # GCS transfers + CSV reads
+    embedder = ThreadPoolExecutor(max_workers=1) # one encode at a time; it already uses every core
     processed_files_count = 0
-    while True:
-        # 1. Find the Oldest Cleaned CSV in GCS
-        oldest_blob = None
-        oldest_timestamp = None
-        print(f"\nSearching for oldest cleaned CSV in gs://{source_bucket_name}/{cleaned_data_prefix}...")
-
-        blobs_iterator = storage_client.list_blobs(source_bucket_name, prefix=cleaned_data_prefix)
-        
-        for blob in blobs_iterator:
-            if blob.name.endswith("_cleaned.csv") and blob.name.startswith(cleaned_data_prefix):
-                filename_without_prefix = blob.name.replace(cleaned_data_prefix, "")
-                timestamp_str = filename_without_prefix.split('_cleaned.csv')[0]
-                try:
-                    current_blob_timestamp = datetime.datetime.strptime(timestamp_str, "%Y%m%d%H%M%S")
-                    if oldest_timestamp is None or current_blob_timestamp < oldest_timestamp:
-                        oldest_timestamp = current_blob_timestamp
-                        oldest_blob = blob
-                except ValueError:
-                    print(f"Warning: Could not parse timestamp from filename: {blob.name}. Skipping this file.")
-                    continue
 
-        if oldest_blob is None:
-            print("No more cleaned CSV files found in GCS bucket. All available files processed or none existed.")
-            break # Exit loop if no more files
-
-        print(f"Found oldest CSV to process: {oldest_blob.name}")
+    async def process_batch(oldest_blob, pool):
+        """Runs one cleaned CSV end to end: download, fetch/parse, embed, insert, move to backup."""
+        global processed_files_count
+        loop = asyncio.get_running_loop()
         gcs_csv_path_to_process = f"gs://{source_bucket_name}/{oldest_blob.name}"
-        
+
         # 2. Download the oldest Cleaned CSV locally to /tmp
         local_csv_path_to_process = os.path.join(local_temp_dir, os.path.basename(oldest_blob.name))
-        
+        # Define local output NDJSON path for this batch
+        timestamp_for_output = os.path.basename(local_csv_path_to_process).replace('_cleaned.csv', '')
+        local_ndjson_output_path = os.path.join(local_extracted_articles_output_dir, f"{timestamp_for_output}_articles.ndjson")
+        backup_write = None
+
         try:
             print(f"Downloading {gcs_csv_path_to_process} to {local_csv_path_to_process}")
-            oldest_blob.download_to_filename(local_csv_path_to_process)
+            await loop.run_in_executor(io_executor, oldest_blob.download_to_filename, local_csv_path_to_process)
             print(f"Downloaded oldest CSV to: {local_csv_path_to_process}")
 
             # 3. Read CSV to get SOURCEURLs and perform Article Extraction
-            df_cleaned_csv = pd.read_csv(local_csv_path_to_process)
+            df_cleaned_csv = await loop.run_in_executor(io_executor, pd.read_csv, local_csv_path_to_process)
             urls_to_fetch = df_cleaned_csv["SOURCEURL"].dropna().unique().tolist()
             print(f"Found {len(urls_to_fetch):,} unique URLs from CSV: {local_csv_path_to_process}")
 
-            # Define local output NDJSON path for this batch
-            timestamp_for_output = os.path.basename(local_csv_path_to_process).replace('_cleaned.csv', '')
-            local_ndjson_output_path = os.path.join(local_extracted_articles_output_dir, f"{timestamp_for_output}_articles.ndjson")
-            
             if not urls_to_fetch:
                 print("No URLs found in this CSV. Skipping article extraction.")
-                extracted_articles_data = [] # Empty list if no URLs to fetch
+                ndjson_lookup = {} # Nothing fetched
             else:
-                print("Starting asynchronous article fetching and parsing for this batch...")
-                if os.path.exists(local_ndjson_output_path):
-                    os.remove(local_ndjson_output_path)
-                
-                asyncio.run(main_async_pipeline(urls_to_fetch, local_ndjson_output_path))
-                print("Asynchronous article fetching and parsing complete.")
-
-                extracted_articles_data = []
-                if os.path.exists(local_ndjson_output_path):
-                    with open(local_ndjson_output_path, 'r', encoding='utf8') as f:
-                        for line in f:
-                            try:
-                                extracted_articles_data.append(json.loads(line))
-                            except json.JSONDecodeError as jde:
-                                print(f"Warning: JSON decode error in {local_ndjson_output_path} line: {jde}")
-                print(f"Loaded {len(extracted_articles_data)} extracted articles from {local_ndjson_output_path}.")
-            
+                print(f"Starting asynchronous article fetching and parsing for batch '{timestamp_for_output}'...")
+                ndjson_lookup = await main_async_pipeline(urls_to_fetch, pool)
+                print(f"Asynchronous article fetching and parsing complete for batch '{timestamp_for_output}': {len(ndjson_lookup)} articles.")
+                # Kept on disk after the batch; written in the background while we embed/insert
+                backup_write = loop.run_in_executor(io_executor, write_ndjson_backup, local_ndjson_output_path, ndjson_lookup)
+
             # 4. Combine data, Generate Embeddings, and Upload to MongoDB
-            ndjson_lookup = {art.get('url'): art for art in extracted_articles_data}
             records_to_insert = []
-            
-            for index, row in df_cleaned_csv.iterrows():
-                csv_row_data = {
-                    'SQLDATE': row['SQLDATE'].strftime('%Y-%m-%d') if pd.notnull(row['SQLDATE']) and isinstance(row['SQLDATE'], pd.Timestamp) else row['SQLDATE'],
-                    'NumMentions': row['NumMentions'],
-                    'SOURCEURL': row['SOURCEURL'],
-                    'latitude': row['latitude'],
-                    'longitude': row['longitude']
-                }
-                url = row['SOURCEURL']
-
-                combined_article = csv_row_data.copy()
+
+            # Vectorised CSV -> dicts (native Python scalars) instead of iterrows()
+            sqldate = df_cleaned_csv['SQLDATE']
+            if pd.api.types.is_datetime64_any_dtype(sqldate):
+                sqldate = sqldate.dt.strftime('%Y-%m-%d')
+            csv_records = df_cleaned_csv[CSV_COLUMNS].assign(SQLDATE=sqldate).to_dict('records')
+
+            for combined_article in csv_records:
+                url = combined_article['SOURCEURL']
                 if url in ndjson_lookup:
                     ndjson_article = ndjson_lookup[url]
                     combined_article.update({k: v for k, v in ndjson_article.items() if k != 'error'})
-                    
-                    summary_text = combined_article.get('summary')
-                    if summary_text and isinstance(summary_text, str) and summary_text.strip() and summary_text != 'null':
-                        summary_embedding = get_embeddings(summary_text, embedding_type="sentencetransformer")
-                        if summary_embedding:
-                            combined_article['summary_embedding'] = summary_embedding
-                        else:
-                            print(f"Warning: Failed to generate embedding for summary of URL: {url}")
-                            combined_article['embedding_error'] = 'embedding_generation_failed'
-                    else:
+                    if not has_summary(combined_article.get('summary')):
                         combined_article['summary_embedding'] = None
                 else:
                     print(f"Warning: URL {url} not found in extracted NDJSON data, adding CSV data only with error flag.")
@@ -341,12 +483,22 @@ if __name__ == "__main__":
                         'error': 'no_ndjson_match'
                     })
                 records_to_insert.append(combined_article)
-            
+
             print(f"Prepared {len(records_to_insert)} records for MongoDB insertion for this batch.")
 
-            if records_to_insert:
-                collection.insert_many(records_to_insert)
-                print(f"Successfully inserted {len(records_to_insert)} articles for batch '{timestamp_for_output}' into MongoDB.")
+            # Embed chunk by chunk: one batched encode per chunk, then the chunk is split
+            # into MONGO_WRITERS shards inserted concurrently while the next chunk is encoded
+            insert_futures = []
+            for start in range(0, len(records_to_insert), ENCODE_CHUNK_SIZE):
+                chunk = records_to_insert[start:start + ENCODE_CHUNK_SIZE]
+                await loop.run_in_executor(embedder, embed_summaries, chunk, embedding_cache)
+                for shard_start in range(0, len(chunk), INSERT_BATCH_SIZE):
+                    shard = chunk[shard_start:shard_start + INSERT_BATCH_SIZE]
+                    insert_futures.append(asyncio.wrap_future(mongo_writer.submit(insert_records, collection, shard)))
+
+            if insert_futures:
+                inserted_count = sum(await asyncio.gather(*insert_futures))
+                print(f"Successfully inserted {inserted_count} articles for batch '{timestamp_for_output}' into MongoDB.")
             else:
                 print(f"No records to insert into MongoDB for batch '{timestamp_for_output}'.")
 
@@ -356,16 +508,16 @@ if __name__ == "__main__":
 
             try:
                 # Correct way to copy the blob to the backup folder
-                source_bucket.copy_blob(oldest_blob, source_bucket, destination_blob_name)
+                await loop.run_in_executor(io_executor, source_bucket.copy_blob, oldest_blob, source_bucket, destination_blob_name)
                 print(f"Copied {oldest_blob.name} to gs://{source_bucket_name}/{destination_blob_name}")
 
                 # Delete the original blob from the source folder
-                oldest_blob.delete()
+                await loop.run_in_executor(io_executor, oldest_blob.delete)
                 print(f"Deleted original processed CSV from GCS: {oldest_blob.name}")
             except Exception as e:
                 print(f"ERROR: Failed to move {oldest_blob.name} to backup folder: {e}")
                 # If move fails, original is left in source for manual inspection
-            
+
             processed_files_count += 1
 
         except Exception as e:
@@ -378,11 +530,61 @@ if __name__ == "__main__":
             if os.path.exists(local_csv_path_to_process):
                 os.remove(local_csv_path_to_process)
                 print(f"Cleaned up local temp CSV: {local_csv_path_to_process}")
-            if os.path.exists(local_ndjson_output_path):
-                os.remove(local_ndjson_output_path)
-                print(f"Cleaned up local temp NDJSON: {local_ndjson_output_path}")
-    
+            if backup_write is not None:
+                try:
+                    await backup_write
+                    print(f"Saved parsed articles to: {local_ndjson_output_path}")
+                except Exception as e:
+                    print(f"Warning: could not write NDJSON backup {local_ndjson_output_path}: {e}")
+
+    async def run_batches():
+        """Feeds cleaned CSVs oldest-first into process_batch, at most BATCHES_IN_FLIGHT at a time."""
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(BATCHES_IN_FLIGHT) # backpressure: bounded batches keep RSS flat
+        pending_blobs = deque()
+        attempted_blob_names = set() # In-flight and failed files stay in GCS; don't pick them up again
+        tasks = set()
+
+        async def run_one(blob, pool):
+            try:
+                await process_batch(blob, pool)
+            finally:
+                in_flight.release()
+
+        # One parse pool shared by every batch, so workers are warmed once per run
+        with ProcessPoolExecutor(max_workers=PROC, initializer=_init_parse_worker) as pool:
+            while True:
+                await in_flight.acquire()
+
+                # 1. Take the Oldest Cleaned CSV; the prefix is listed once and only re-listed when drained
+                if not pending_blobs:
+                    print(f"\nSearching for cleaned CSVs in gs://{source_bucket_name}/{cleaned_data_prefix}...")
+                    pending_blobs = await loop.run_in_executor(
+                        io_executor, list_cleaned_blobs,
+                        storage_client, source_bucket_name, cleaned_data_prefix, attempted_blob_names
+                    )
+
+                if not pending_blobs:
+                    in_flight.release()
+                    if not tasks:
+                        print("No more cleaned CSV files found in GCS bucket. All available files processed or none existed.")
+                        break # Exit loop if no more files
+                    # Batches still running may be followed by newly uploaded files; re-list once one finishes
+                    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                oldest_blob = pending_blobs.popleft()
+                attempted_blob_names.add(oldest_blob.name)
+                print(f"Found oldest CSV to process: {oldest_blob.name}")
+                task = asyncio.create_task(run_one(oldest_blob, pool))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    asyncio.run(run_batches())
+
     print(f"\nBatch processing complete! Total files processed: {processed_files_count}")
+    for executor in (io_executor, embedder, mongo_writer):
+        executor.shutdown()
     mongo_client.close()
     print("MongoDB connection closed.")
 